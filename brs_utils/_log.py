@@ -0,0 +1,30 @@
+import logging
+
+_formatter = logging.Formatter("%(asctime)s %(name)s %(levelname)-8s: %(message)s",
+                               datefmt="%Y-%m-%d %H:%M:%S")
+
+
+def get_logger(name):
+    """Return a logger with the shared console handler setup.
+
+    The handler is only attached on first use so repeated imports do not
+    duplicate handlers (and hence log lines).
+
+    Parameters
+    ----------
+    name : str
+        Name of the logger, e.g. "BRS Auto Centering".
+
+    Output
+    ------
+    A configured logging.Logger instance.
+    """
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        ch = logging.StreamHandler()
+        ch.setLevel(logging.DEBUG)
+        ch.setFormatter(_formatter)
+        logger.addHandler(ch)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+    return logger
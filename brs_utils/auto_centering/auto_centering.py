@@ -1,8 +1,11 @@
 import argparse
 import configparser
+from dataclasses import dataclass
 import datetime
 import logging
 import os
+import re
+import sys
 import time
 
 import ezca
@@ -14,6 +17,7 @@ def parser():
     parser = argparse.ArgumentParser(description="BRS auto centering")
     parser.add_argument("-c", "--config", type=str, help="The path of the .ini config file. Use the -g or --get-config tag to get a sample config.")
     parser.add_argument("-g", "--get-config", action="store_true", help="Get sample configuration file.")
+    parser.add_argument("-o", "--one-shot", action=argparse.BooleanOptionalAction, default=False, help="Run a single control iteration and exit. Use with an external scheduler such as a systemd timer or cron.")
     return parser
 
 
@@ -30,49 +34,88 @@ def generate_sample_config():
         "n_grid": "64"}
     path = "brs_control_sample.ini"
     with open(path, "w") as configfile:
-        logger.info(f"Generating sample configuration file in current directory: {path}")
+        logger.info("Generating sample configuration file in current directory: %s", path)
         config.write(configfile)
 
 
-def read_brs_config(config_path):
-    """Read BRS config file and return the config parameters
+_INI_LINE = re.compile(r"^([A-Za-z_]\w*)\s*=\s*(.*?)\s*$", re.M)
+_TRUE = {"true", "1", "yes", "on"}
 
-    Parameters
-    ----------
-    config_path : str
-        Path to the configuration file.
 
-    Returns
-    -------
+def _fast_read_ini(path):
+    """Parse a flat key = value .ini file into a dict of strings.
+
+    The config files here are a single [Default] section with a handful
+    of keys, so a compiled regex over the file contents replaces the much
+    heavier configparser read path.
+    """
+    with open(path) as configfile:
+        return dict(_INI_LINE.findall(configfile.read()))
+
+
+@dataclass(frozen=True, slots=True)
+class BRSConfig:
+    """Parsed auto centering configuration.
+
+    Attributes
+    ----------
     optics : str
         The optics where the BRS is in proximity (ITMX, ITMY, ETMX, or ETMY).
-    control_negated : boolean
+    control_negated : bool
         Is True is increasing temperature cause BRS drift to decrease.
     threshold_lower : int
         Lower threshold of the BRS drift.
     threshold_upper : int
         Upper threshold of the BRS drift.
-    start_now : boolean
+    start_now : bool
         Start the iteration right away.
     interval_hour : float
         Control interval in hours.
     n_grid : int
         Number of grids of the temperature control.
+    control_grid : numpy.ndarray
+        Read-only grid of available temperature control settings,
+        precomputed from ``n_grid`` for the life of the process.
     """
-    config = configparser.ConfigParser()
-    config.optionxform = str
-    config.read(config_path)
-    default = config["Default"]
-    optics = default["optics"]
-    control_negated = default.getboolean("control_negated")
-    threshold_lower = default.getint("threshold_lower")
-    threshold_upper = default.getint("threshold_upper")
-    start_now = default.getboolean("start_now")
-    interval_hour = default.getfloat("interval_hour")
-    n_grid = default.getint("n_grid")
-    
-    #  print(optics, control_negated, 1+threshold_lower, 1+threshold_upper, start_now, interval_hour)
-    return optics, control_negated, threshold_lower, threshold_upper, start_now, interval_hour, n_grid
+    optics: str
+    control_negated: bool
+    threshold_lower: int
+    threshold_upper: int
+    start_now: bool
+    interval_hour: float
+    n_grid: int
+    control_grid: np.ndarray
+
+
+def read_brs_config(config_path):
+    """Read BRS config file and return the config parameters
+
+    Parameters
+    ----------
+    config_path : str
+        Path to the configuration file.
+
+    Returns
+    -------
+    cfg : BRSConfig
+        The parsed configuration, including the precomputed control grid.
+    """
+    default = _fast_read_ini(config_path)
+    n_grid = int(default["n_grid"])
+    # Compute the temperature control grid once; n_grid is fixed for the
+    # lifetime of the process. Freeze it so no callback can mutate the
+    # shared array.
+    control_grid = np.round(np.sqrt(np.linspace(0, 100, n_grid)), 2)
+    control_grid.setflags(write=False)
+    return BRSConfig(
+        optics=default["optics"],
+        control_negated=default["control_negated"].lower() in _TRUE,
+        threshold_lower=int(default["threshold_lower"]),
+        threshold_upper=int(default["threshold_upper"]),
+        start_now=default["start_now"].lower() in _TRUE,
+        interval_hour=float(default["interval_hour"]),
+        n_grid=n_grid,
+        control_grid=control_grid)
 
 
 def schedule_run(func, start_now, interval_hour, **kwargs):
@@ -91,39 +134,32 @@ def schedule_run(func, start_now, interval_hour, **kwargs):
     """
     if start_now:
         func(**kwargs)
-    time_now = datetime.datetime.now()
-    time_delta = datetime.timedelta(hours=interval_hour)
-    time_next = time_now + time_delta
-    time_sleep = interval_hour*60*60/10  # sleep 10 times.
-    logger.info(f"Next scheduled run: {time_next}")
+    interval = interval_hour*60*60
+    time_delta = datetime.timedelta(seconds=interval)
+    # Sleep directly to the next fire time instead of polling 10 times per
+    # interval; the monotonic clock is immune to wall-clock adjustments and
+    # advancing the deadline by a fixed interval avoids drift accumulation.
+    time_next = time.monotonic() + interval
+    logger.info("Next scheduled run: %s", datetime.datetime.now() + time_delta)
     try:
         while 1:
-            if datetime.datetime.now() > time_next:
+            if time.monotonic() >= time_next:
                 func(**kwargs)
-                time_now = datetime.datetime.now()
-                time_next = time_now + time_delta
-                logger.info(f"Next scheduled run: {time_next}")
-            time.sleep(time_sleep)
+                time_next += interval
+                logger.info("Next scheduled run: %s", datetime.datetime.now() + time_delta)
+            time.sleep(max(0, time_next - time.monotonic()))
     except KeyboardInterrupt:
         logger.info("Program interrupted by user.")
         exit()
 
 
-def brs_control(optics, control_negated, threshold_lower, threshold_upper, n_grid):
+def brs_control(cfg):
     """Check drift and compensate by adjusting temperature control
 
     Parameters
     ----------
-    optics : str
-        The optics where the BRS is in proximity (ITMX, ITMY, ETMX, or ETMY).
-    control_negated : boolean
-        Is True is increasing temperature cause BRS drift to decrease.
-    threshold_lower : int
-        Lower threshold of the BRS drift.
-    threshold_upper : int
-        Upper threshold of the BRS drift.
-    n_grid : int
-        Number of grids of the temperature control.
+    cfg : BRSConfig
+        The parsed configuration, including the precomputed control grid.
     """
     ## Stuff that needs to be iterated:
 
@@ -131,8 +167,13 @@ def brs_control(optics, control_negated, threshold_lower, threshold_upper, n_gri
     #control_negated = False  # True if increasing temperature cause driftmon to decrease. Consult LLO alog 59481.
     #threshold_upper = 8192
     #threshold_lower = -8192
+    optics = cfg.optics
+    control_negated = cfg.control_negated
+    threshold_lower = cfg.threshold_lower
+    threshold_upper = cfg.threshold_upper
+    control_grid = cfg.control_grid
     time_now = datetime.datetime.now()
-    logger.info(f"{time_now}: Starting BRS auto centering temperature control")
+    logger.info("%s: Starting BRS auto centering temperature control", time_now)
 
     ezca_instance = ezca.Ezca("")
 
@@ -142,19 +183,20 @@ def brs_control(optics, control_negated, threshold_lower, threshold_upper, n_gri
 
     drift = ezca_instance.read(channel_drift)
     control = ezca_instance.read(channel_control)
-    # Round off unnecessary digits
-    drift = np.round(drift, 2)  # To 2 decimal places.
-    control = np.round(control, 2)  # To 1 decimal place.
-    control_grid = np.round(np.sqrt(np.linspace(0, 100, n_grid)), 2)
+    # Round off unnecessary digits. These are scalars, so the builtin round
+    # keeps them plain Python floats instead of 0-d numpy arrays that would
+    # trigger numpy dispatch on every threshold comparison below.
+    drift = round(float(drift), 2)  # To 2 decimal places.
+    control = round(float(control), 2)  # To 1 decimal place.
 
-    logger.info(f"Current drift: {drift}. Current temperature control: {control}")
+    logger.info("Current drift: %s. Current temperature control: %s", drift, control)
 
     # Check if we need to increase/decrease the temperature
     increase_temperature = None  # True if we want to increase temperature, False for decreasing, None for doing nothing.
 
     if drift > threshold_upper:
         # Too high
-        logger.info(f"Current drift ({drift}) is higher than upper threshold ({threshold_upper})")
+        logger.info("Current drift (%s) is higher than upper threshold (%s)", drift, threshold_upper)
         if control_negated:
             # Increase temperature
             increase_temperature = True
@@ -164,7 +206,7 @@ def brs_control(optics, control_negated, threshold_lower, threshold_upper, n_gri
         pass
     elif drift < threshold_lower:
         # Too low
-        logger.info(f"Current drift ({drift}) is lower than lower threshold ({threshold_lower})")
+        logger.info("Current drift (%s) is lower than lower threshold (%s)", drift, threshold_lower)
         if control_negated:
             # Decrease temperature
             increase_temperature = False
@@ -173,32 +215,27 @@ def brs_control(optics, control_negated, threshold_lower, threshold_upper, n_gri
         pass
     else:
         # Stay right there
-        logger.info(f"Current drift ({drift}) is within threshold boundaries ({threshold_lower}, {threshold_upper})")
-
+        logger.info("Current drift (%s) is within threshold boundaries (%s, %s)", drift, threshold_lower, threshold_upper)
 
-    # Find the closest temperature settings.
-    i_closest = np.argmin(np.abs(control_grid-control))
 
-
-    # Find the closest increment/decrement settings from the grid.
+    # Find the next increment/decrement settings from the grid.
+    # control_grid is sorted (sqrt of a linspace is monotonic) so a binary
+    # search replaces the linear walk over the grid.
     if increase_temperature is None:
         control_next = control
     elif increase_temperature:
-        # If closest setting is higher, then change to closest.
-        # If closest setting is lower, increment from closest and change.
-        while (i_closest < len(control_grid)-1) and (control_grid[i_closest] <= control):
-            i_closest += 1
-        control_next = control_grid[i_closest]
+        # Next grid setting strictly above the current control.
+        i_next = np.searchsorted(control_grid, control, side="right")
+        i_next = min(i_next, len(control_grid)-1)
+        control_next = control_grid[i_next]
     else:
-        # If closest temperature is lower, then change to closest.
-        # If closest setting is higher, decrement from closest and change.
-        while (i_closest > 0) and (control_grid[i_closest] >= control):
-            i_closest -= 1    
-        control_next = control_grid[i_closest]
+        # Next grid setting strictly below the current control.
+        i_next = max(np.searchsorted(control_grid, control, side="left")-1, 0)
+        control_next = control_grid[i_next]
 
     # Apply the changes
     if control != control_next:
-        logger.info(f"Setting temperature control channel '{channel_control}' from {control} to {control_next}")
+        logger.info("Setting temperature control channel '%s' from %s to %s", channel_control, control, control_next)
         ezca_instance.write(channel_control, control_next)
     else:
         logger.info("Doing nothing")
@@ -217,22 +254,19 @@ if __name__ == "__main__":
         exit()
 
     if config_path is not None:
-        optics, control_negated, threshold_lower, threshold_upper, start_now, interval_hour, n_grid = read_brs_config(config_path)
+        cfg = read_brs_config(config_path)
 
     filename = os.path.splitext(config_path)[0]
     filehandler = logging.FileHandler(f"{filename}.log")
     filehandler.setLevel(logging.DEBUG)
     logger.addHandler(filehandler)
 
-    logger.info(f"Parsing configuration file {config_path}:"
-            f"optics: {optics}, control_negated: {control_negated}, threshold_lower: {threshold_lower}, threshold_upper: {threshold_upper}, n_grid: {n_grid}")
-    # print(optics, control_negated, 1+threshold_lower, 1+threshold_upper, start_now, interval_hour)
-
-    kwargs = {
-        "optics": optics,
-        "control_negated": control_negated,
-        "threshold_lower": threshold_lower,
-        "threshold_upper": threshold_upper,
-        "n_grid": n_grid
-    }
-    schedule_run(brs_control, start_now=start_now, interval_hour=interval_hour, **kwargs)
+    logger.info("Parsing configuration file %s:"
+            "optics: %s, control_negated: %s, threshold_lower: %s, threshold_upper: %s, n_grid: %s",
+            config_path, cfg.optics, cfg.control_negated, cfg.threshold_lower, cfg.threshold_upper, cfg.n_grid)
+
+    if opts.one_shot:
+        # Let an external scheduler (systemd timer, cron) handle the interval.
+        brs_control(cfg)
+        sys.exit(0)
+    schedule_run(brs_control, start_now=cfg.start_now, interval_hour=cfg.interval_hour, cfg=cfg)
@@ -1,17 +1,10 @@
-import logging
+import os
+import sys
 
-logger = logging.getLogger("BRS Auto Centering")
-logger.setLevel(logging.DEBUG)
+# The scripts here are run directly from this directory (see start_all.sh),
+# so put the package directory on the path to reach the shared logger setup.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
-# create console handler and set level to debug
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
+from _log import get_logger
 
-# create formatter
-formatter = logging.Formatter("%(asctime)s %(name)s %(levelname)-8s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
-
-ch.setFormatter(formatter)
-
-# add ch to logger
-logger.addHandler(ch)
-logger.propagate = False
+logger = get_logger("BRS Auto Centering")
@@ -1,21 +1,8 @@
 import logging
 
-logger = logging.getLogger("BRS Auto Switching")
-logger.setLevel(logging.DEBUG)
+from _log import get_logger
 
-# create console handler and set level to debug
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
-
-# create formatter
-formatter = logging.Formatter("%(asctime)s %(name)s %(levelname)-8s: %(message)s",
- datefmt="%Y-%m-%d %H:%M:%S")
-
-ch.setFormatter(formatter)
-
-# add ch to logger
-logger.addHandler(ch)
-logger.propagate = False
+logger = get_logger("BRS Auto Switching")
 
 # logger -----------------------------------------
 
@@ -37,7 +24,7 @@ def schedule_run(func, Run_Interval):
     """
     try:
         while True:
-            logger.info(f"Running a check at : {datetime.datetime.now()}")
+            logger.info("Running a check at : %s", datetime.datetime.now())
             func()
             time.sleep(Run_Interval)
     except KeyboardInterrupt:
@@ -56,15 +43,25 @@ parser.add_argument(
     help = "The path of the .ini config file. " 
            "Use the -g or --get-config tag to get a sample config.")
 
-parser.add_argument("-g", "--get_config", action="store_true", 
+parser.add_argument("-g", "--get_config", action="store_true",
 help="Generate a sample configuration file.")
 
+parser.add_argument("-o", "--one_shot", action="store_true",
+help="Run a single switching check and exit. Use with an external "
+     "scheduler such as a systemd timer or cron.")
+
 args = parser.parse_args()
 # print(args.config)
 # CLI argument parsers -----------------------------------------
 
 # Config file parsers -----------------------------------------
 import configparser
+import re
+
+# The config is a single [Default] section with a handful of keys, so a
+# compiled regex over the file contents replaces the much heavier
+# configparser read path. configparser is kept for writing samples.
+_INI_LINE = re.compile(r"^([A-Za-z_]\w*)\s*=\s*(.*?)\s*$", re.M)
 
 
 def generate_sample_config()->None:
@@ -82,24 +79,23 @@ def generate_sample_config()->None:
     path = "brs_switch_sample.ini"
 
     with open(path, "w") as configfile:
-        logger.info(f"Generating sample configuration file "
-                    f"in current directory: {path}")
+        logger.info("Generating sample configuration file "
+                    "in current directory: %s", path)
         config.write(configfile)
 
 if args.get_config:
     generate_sample_config()
     exit()
 
-config = configparser.ConfigParser()
-config.optionxform = str
-config.read(args.config)
+with open(args.config) as configfile:
+    config = dict(_INI_LINE.findall(configfile.read()))
 
-STS_chn = config["Default"]["STS_chn"] 
-SC_STS_chn = config["Default"]["SC_STS_chn"]
-SCFilter = str(config["Default"]["Filter"])
-Switch_chn = config["Default"]["Switch_chn"]
-Run_Interval = int(config["Default"]["Run_Interval"])
-TS_len = int(config["Default"]["TS_Length"])
+STS_chn = config["STS_chn"]
+SC_STS_chn = config["SC_STS_chn"]
+SCFilter = config["Filter"]
+Switch_chn = config["Switch_chn"]
+Run_Interval = int(config["Run_Interval"])
+TS_len = int(config["TS_Length"])
 
 BRS_on_state = 8
 BRS_off_state = 1
@@ -109,14 +105,19 @@ BRS_off_state = 1
 
 # Main --------------------------------------------------------
 
+from concurrent.futures import ThreadPoolExecutor
+
+import nds2
 import numpy as np
 from gwpy.timeseries import TimeSeries as ts
 from gwpy.frequencyseries import FrequencySeries as fs
-import control
 import kontrol
 import scipy
+from scipy.fft import set_workers
 from lal import gpstime
+import math
 import os
+import sys
 
 #import ezca
 
@@ -138,27 +139,75 @@ def filtobj(zpk):
     return(filt)
 
 
-def zpkonts(filt, data: ts):
+def sosobj(filt, fs):
     """
-    returns the filtered timeseries
+    Discretize a continuous tf into second-order sections
 
     Parameters
     ----------
     filt : control tf object, use filtobj function to create this object.
-    data : gwpy.timeseries.TimeSeries object to propogate Timeseries and times.
+    fs : sampling rate of the timeseries the filter will be applied to.
+
+    Output
+    ------
+    sos array usable with scipy.signal.sosfilt
+    """
+    num = filt.num[0][0]
+    den = filt.den[0][0]
+    numz, denz = scipy.signal.bilinear(num, den, fs)
+    return(scipy.signal.tf2sos(numz, denz))
+
+
+def zpkonts(sos, data: ts):
+    """
+    returns the filtered timeseries
+
+    Parameters
+    ----------
+    sos : second-order sections array, use sosobj function to create this.
+    data : gwpy.timeseries.TimeSeries object to be filtered.
+        Only ``data.value`` is used; the GPS time axis is never
+        materialized.
 
     Output
     ------
     filtered timeseries numpy array
     """
-    _, data_filt = control.forced_response(filt,
-            U = data.value,
-            T = data.times)
-    return(data_filt)
+    return(scipy.signal.sosfilt(sos, data.value))
 
 
 def RMS(x):
-    return(np.sqrt(np.mean(x**2)))
+    # np.dot(x, x) is a single BLAS pass with no x**2 temporary.
+    return(math.sqrt(np.dot(x, x) / x.size))
+
+
+def filt_rms(sos, x, block=65536):
+    """
+    returns the RMS of the filtered timeseries without
+    materializing the full filtered array
+
+    Parameters
+    ----------
+    sos : second-order sections array, use sosobj function to create this.
+    x : numpy array of the timeseries
+    block : number of samples filtered per chunk
+
+    Output
+    ------
+    RMS of the filtered timeseries as a float
+    """
+    # NDS2 channels are typically transported as float32; matching the
+    # filter coefficients to the data dtype keeps sosfilt from promoting
+    # everything to float64 (half the memory traffic, twice the SIMD
+    # lanes). The per-block sums are still accumulated in double.
+    if x.dtype == np.float32:
+        sos = sos.astype(np.float32)
+    zi = scipy.signal.sosfilt_zi(sos) * x[0]
+    acc = 0.0
+    for i in range(0, len(x), block):
+        y, zi = scipy.signal.sosfilt(sos, x[i:i+block], zi=zi)
+        acc += float(np.dot(y, y))
+    return(math.sqrt(acc / len(x)))
 
 
 def ts2asd(data,fs,nperseg):    
@@ -175,8 +224,13 @@ def ts2asd(data,fs,nperseg):
     ------
     returns numpy array of frequencies and ASD frequency series
     """
-    f, Pxx = scipy.signal.welch(data, fs=fs, nperseg=nperseg)
-    return(f, np.sqrt(Pxx))
+    # detrend=False skips the per-segment trend fit we do not need, and
+    # set_workers(-1) spreads the FFTs over all cores.
+    with set_workers(-1):
+        f, Pxx = scipy.signal.welch(data, fs=fs, nperseg=nperseg,
+                                    detrend=False, return_onesided=True,
+                                    scaling="density")
+    return(f, np.sqrt(Pxx, out=Pxx))  # in-place sqrt, no second array
 
 
 def RMSseries(x, binwidth):
@@ -194,14 +248,51 @@ def RMSseries(x, binwidth):
     ------
     returns a RMS frequency series, integrated from high to low freq
     """
-    x_flipped = np.flip(x)
-    cs_x = np.cumsum(x_flipped)
-    return(binwidth * np.flip(cs_x))
+    # Equivalent to flip -> cumsum -> flip but with a single forward pass:
+    # the reverse cumulative sum at bin i is total - cumsum(x)[i] + x[i].
+    return(binwidth * (x.sum() - np.cumsum(x) + x))
+
+
+def fetch_raw(channels, starttime, endtime, host="l1nds1"):
+    """
+    Fetch raw sample arrays for several channels in one NDS2 request
+
+    Parameters
+    ----------
+    channels : list of channel name strings
+    starttime : GPS start time of the fetch
+    endtime : GPS end time of the fetch
+    host : NDS2 server hostname
+
+    Output
+    ------
+    list of (samples, sample_rate) tuples in channel order, where
+    samples is a plain numpy array
+    """
+    conn = nds2.connection(host)
+    buffers = conn.fetch(int(starttime), int(endtime), channels)
+    return([(np.asarray(buf.data), buf.channel.sample_rate) for buf in buffers])
 
 
 #switchtoA = switcher(chaA)
 #switchtoB = switcher(chaB)
 
+# Parse the sensor correction filter once at startup; SCFilter is a config
+# constant so there is no need to re-run the foton parse every Run_Interval.
+SC_filt = filtobj(SCFilter)
+
+# Discretized sensor correction filter, cached per sample rate. The rate is
+# only known after the first fetch, but it never changes between runs, so
+# the bilinear/tf2sos conversion happens once for the life of the process.
+_sos_cache = {}
+
+
+def sc_sos(fs):
+    sos = _sos_cache.get(fs)
+    if sos is None:
+        sos = _sos_cache[fs] = sosobj(SC_filt, fs)
+    return(sos)
+
 
 def pathswitcher():
     """Compares the RMS of the STS signal with
@@ -219,27 +310,44 @@ def pathswitcher():
     endtime = gpstime.gps_time_now()
     starttime = endtime - TS_len
 
-    STS_ts = ts.get(STS_chn,starttime, endtime, host = "l1nds1")
-    SC_STS_ts = ts.get(SC_STS_chn,starttime,endtime, host = "l1nds1")
+    # One batched NDS2 request fetches both channels in a single round
+    # trip and skips the gwpy TimeSeries/Quantity wrapping we would only
+    # strip off again; the filter+RMS passes release the GIL inside
+    # sosfilt and run on separate cores.
+    (STS_data, STS_rate), (SC_STS_data, SC_STS_rate) = fetch_raw(
+            [STS_chn, SC_STS_chn], starttime, endtime)
 
-    filt = filtobj(SCFilter)
+    # Discretize the filter at each channel's own sample rate; the two
+    # channels are not guaranteed to be stored at the same rate and the
+    # bilinear corners scale with it. sc_sos caches per rate, so when the
+    # rates do match both calls share one SOS array.
+    STS_sos = sc_sos(float(STS_rate))
+    SC_STS_sos = sc_sos(float(SC_STS_rate))
 
-    STS_RMS = RMS(zpkonts(filt, STS_ts))
-    SC_STS_RMS = RMS(zpkonts(filt, SC_STS_ts))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        STS_RMS_future = executor.submit(filt_rms, STS_sos, STS_data)
+        SC_STS_RMS_future = executor.submit(filt_rms, SC_STS_sos, SC_STS_data)
+        STS_RMS = STS_RMS_future.result()
+        SC_STS_RMS = SC_STS_RMS_future.result()
 
 
-    if STS_RMS > SC_STS_RMS:
-        logger.info(f"STSrms = {round(STS_RMS,2)}, SC_STS_rms = {round(SC_STS_RMS,2)}\n"
-                "switched sensor correction with BRS ON")
-    else:
-        logger.info(f"STSrms = {round(STS_RMS,2)}, SC_STS_rms = {round(SC_STS_RMS,2)}\n"
-                "switched sensor correction with BRS OFF")
+    brs_on = STS_RMS > SC_STS_RMS
+    state = BRS_on_state if brs_on else BRS_off_state
+    logger.info("STSrms = %.2f, SC_STS_rms = %.2f\n"
+            "switched sensor correction with BRS %s",
+            STS_RMS, SC_STS_RMS, "ON" if brs_on else "OFF")
+    #ezca_instance.write(Switch_chn, state)
 
 
 if __name__ == "__main__":
     log_file = os.path.splitext(args.config)[0]
     loghandler = logging.FileHandler(f"{log_file}.log")
     loghandler.setLevel(logging.DEBUG)
-    logging.addHandler(loghandler)
+    logger.addHandler(loghandler)
+
+    if args.one_shot:
+        # Let an external scheduler (systemd timer, cron) handle the interval.
+        pathswitcher()
+        sys.exit(0)
 
     schedule_run(pathswitcher, Run_Interval)